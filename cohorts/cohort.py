@@ -26,30 +26,24 @@ import inspect
 import logging
 import pickle
 import numpy as np
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 
 # pylint doesn't like this line
 # pylint: disable=no-name-in-module
 from types import FunctionType
 
-import vap  ## vcf-annotate-polyphen
-from sqlalchemy import create_engine
-
 from pyensembl import cached_release
 
 import varcode
 from varcode import EffectCollection, VariantCollection
 from mhctools import NetMHCcons, EpitopeCollection
-from topiary import predict_epitopes_from_variants, epitopes_to_dataframe
-from topiary.sequence_helpers import contains_mutant_residues
-from isovar.allele_reads import reads_overlapping_variants
-from isovar.protein_sequences import reads_generator_to_protein_sequences_generator, protein_sequences_generator_to_dataframe
-from pysam import AlignmentFile
 from scipy.stats import pearsonr
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 from tqdm import tqdm
 
 from .dataframe_loader import DataFrameLoader
-from .utils import DataFrameHolder, first_not_none_param, filter_not_null, InvalidDataError, strip_column_names as _strip_column_names, get_logger, get_cache_dir
+from .utils import DataFrameHolder, first_not_none_param, filter_not_null, InvalidDataError, strip_column_names as _strip_column_names, get_logger, get_cache_dir, MAX_LOAD_WORKERS
 from .provenance import compare_provenance
 from .survival import plot_kmf
 from .plot import mann_whitney_plot, fishers_exact_plot, roc_curve_plot, stripboxplot, CorrelationResults
@@ -63,6 +57,10 @@ from . import variant_filters
 
 logger = get_logger(__name__, level=logging.INFO)
 
+# Number of pickled cache objects (e.g. a patient's variants or effects) kept in memory
+# by each Cohort, on top of the disk cache.
+MEMORY_CACHE_SIZE = 32
+
 class Cohort(Collection):
     """
     Represents a cohort of `Patient`s.
@@ -184,6 +182,16 @@ class Cohort(Collection):
         self.benefit_plot_name = benefit_plot_name
         self.merge_type = merge_type
         self._genome = None
+        self._patient_index = (None, 0, {})
+        self._batch_patient_ids = None
+        self._batch_cache = None
+        # Recently loaded or saved cached objects, to avoid re-reading them from disk.
+        self._memory_cache = OrderedDict()
+        # MHC models, keyed by alleles and prediction parameters, shared across patients.
+        self._mhc_model_cache = {}
+        # (inputs, DataFrame) loaded by each DataFrameLoader, so they're only loaded once.
+        self._df_loader_cache = {}
+        self._provenance = None
 
         self.verify_id_uniqueness()
         self.verify_survival()
@@ -224,24 +232,37 @@ class Cohort(Collection):
         raise ValueError("No variants to derive genome from")
 
     def verify_id_uniqueness(self):
-        patient_ids = set([patient.id for patient in self])
-        if len(patient_ids) != len(self):
+        if len(self._patients_by_id(rebuild=True)) != len(self):
             raise ValueError("Non-unique patient IDs")
 
+    def _patients_by_id(self, rebuild=False):
+        """
+        A dict of patient ID to `Patient`, rebuilt whenever `elements` is replaced
+        (e.g. by `filter`) or changes length. Swapping a patient in place for another
+        one, without changing the length, isn't detected; pass `rebuild=True` then.
+        """
+        index_elements, index_length, index = self._patient_index
+        if (rebuild or index_elements is not self.elements or
+                index_length != len(self.elements)):
+            index = dict((patient.id, patient) for patient in self)
+            self._patient_index = (self.elements, len(self.elements), index)
+        return index
+
     def verify_survival(self):
         cohort_dataframe = self.as_dataframe()
-        if not (cohort_dataframe["pfs"] <=
-                cohort_dataframe["os"]).all():
-            raise InvalidDataError("PFS should be <= OS, but PFS is larger than OS for some patients.")
-
-        def func(row):
-            if row["pfs"] < row["os"]:
-                if not row["progressed_or_deceased"]:
-                    raise InvalidDataError(
-                        "A patient did not progress despite PFS being less than OS. "
-                        "Full row: %s" % row)
+        pfs_after_os = ~(cohort_dataframe["pfs"] <= cohort_dataframe["os"])
+        if pfs_after_os.any():
+            raise InvalidDataError(
+                "PFS should be <= OS, but PFS is larger than OS for patients: %s" %
+                ", ".join(cohort_dataframe["patient_id"][pfs_after_os].astype(str)))
+
         if self.responder_pfs_equals_os:
-            cohort_dataframe.apply(func, axis=1)
+            did_not_progress = ((cohort_dataframe["pfs"] < cohort_dataframe["os"]) &
+                                ~cohort_dataframe["progressed_or_deceased"].astype(bool))
+            if did_not_progress.any():
+                raise InvalidDataError(
+                    "A patient did not progress despite PFS being less than OS. "
+                    "Full row: %s" % cohort_dataframe[did_not_progress].iloc[0])
 
     def _as_dataframe_unmodified(self, join_with=None, join_how=None):
         # Use join_with if specified, otherwise fall back to what is defined in the class
@@ -272,7 +293,8 @@ class Cohort(Collection):
         df_loader_dfs = {}
         col_counts = defaultdict(int)
         for df_loader in df_loaders:
-            df_loader_dfs[df_loader] = df_loader.load_dataframe()
+            # A copy, since duplicated columns are renamed in place below.
+            df_loader_dfs[df_loader] = self._load_df_loader(df_loader)
             for col in df_loader_dfs[df_loader].columns:
                 col_counts[col] += 1
         for col, count in col_counts.items():
@@ -366,32 +388,37 @@ class Cohort(Collection):
         def is_lambda(func):
             return func.__name__ == (lambda: None).__name__
 
+        # Functions are applied row by row, but many of them load per-patient data:
+        # let them load it for all of the DataFrame's patients at once instead.
         if type(on) == FunctionType:
-            return apply_func(on, func_name(on), df).return_self(return_cols)
+            with self._batch(df["patient_id"]):
+                return apply_func(on, func_name(on), df).return_self(return_cols)
 
         if len(kwargs) > 0:
             logger.warning("Note: kwargs used with multiple functions; passing them to all functions")
 
         if type(on) == dict:
             cols = []
-            for key, value in on.items():
-                if type(value) == str:
-                    df[key] = df[value]
-                    col = key
-                elif type(value) == FunctionType:
-                    col, df = apply_func(on=value, col=key, df=df)
-                else:
-                    raise ValueError("A value of `on`, %s, is not a str or function" % str(value))
-                cols.append(col)
+            with self._batch(df["patient_id"]):
+                for key, value in on.items():
+                    if type(value) == str:
+                        df[key] = df[value]
+                        col = key
+                    elif type(value) == FunctionType:
+                        col, df = apply_func(on=value, col=key, df=df)
+                    else:
+                        raise ValueError("A value of `on`, %s, is not a str or function" % str(value))
+                    cols.append(col)
         if type(on) == list:
             cols = []
-            for i, elem in enumerate(on):
-                if type(elem) == str:
-                    col = elem
-                elif type(elem) == FunctionType:
-                    col = func_name(elem, i)
-                    col, df = apply_func(on=elem, col=col, df=df)
-                cols.append(col)
+            with self._batch(df["patient_id"]):
+                for i, elem in enumerate(on):
+                    if type(elem) == str:
+                        col = elem
+                    elif type(elem) == FunctionType:
+                        col = func_name(elem, i)
+                        col, df = apply_func(on=elem, col=col, df=df)
+                    cols.append(col)
 
         if rename_cols:
             rename_dict = _strip_column_names(df.columns, keep_paren_contents=keep_paren_contents)
@@ -399,12 +426,31 @@ class Cohort(Collection):
             cols = [rename_dict[col] for col in cols]
         return DataFrameHolder(cols, df).return_self(return_cols)
 
+    @contextmanager
+    def _batch(self, patient_ids):
+        """
+        For the duration of the `with` block, keep track of the patients that functions
+        are being applied to, along with a cache of data loaded for all of them at once.
+        See `functions._batch_load`.
+        """
+        if self._batch_patient_ids is not None:
+            # Already in a batch, e.g. a function calling `as_dataframe` itself.
+            yield
+            return
+        self._batch_patient_ids = list(patient_ids)
+        self._batch_cache = {}
+        try:
+            yield
+        finally:
+            self._batch_patient_ids = None
+            self._batch_cache = None
+
     def load_dataframe(self, df_loader_name):
         """
         Instead of joining a DataFrameJoiner with the Cohort in `as_dataframe`, sometimes
         we may want to just directly load a particular DataFrame.
         """
-        logger.debug("loading dataframe: {}".format(df_loader_name))
+        logger.debug("loading dataframe: %s", df_loader_name)
         # Get the DataFrameLoader object corresponding to this name.
         df_loaders = [df_loader for df_loader in self.df_loaders if df_loader.name == df_loader_name]
 
@@ -413,30 +459,93 @@ class Cohort(Collection):
         if len(df_loaders) > 1:
             raise ValueError("Multiple DataFrameLoaders with name %s" % df_loader_name)
 
-        return df_loaders[0].load_dataframe()
+        return self._load_df_loader(df_loaders[0])
+
+    def _df_loader_inputs(self, df_loader):
+        """
+        The patients and settings that a built-in `DataFrameLoader` reads, so that
+        changing them invalidates its cached DataFrame. Other loaders have none.
+        """
+        load_dataframe = df_loader.load_dataframe
+        cohort = getattr(load_dataframe, "__self__", None)
+        if not isinstance(cohort, Cohort):
+            return ()
+        func = getattr(load_dataframe, "__func__", None)
+        cohort_class = type(cohort)
+        if func is cohort_class.load_kallisto:
+            settings = (cohort.kallisto_ensembl_version,)
+        elif func is cohort_class.load_cufflinks:
+            settings = ()
+        elif func is cohort_class.load_ensembl_coverage:
+            settings = (cohort.pageant_coverage_path,
+                        cohort.pageant_dir_fn,
+                        cohort.min_coverage_normal_depth,
+                        cohort.min_coverage_tumor_depth)
+        else:
+            return ()
+        return (tuple(patient.id for patient in cohort),) + settings
+
+    def _load_df_loader(self, df_loader):
+        """
+        Return a copy of the DataFrame loaded by `df_loader`, only re-loading it
+        when its inputs (see `_df_loader_inputs`) change.
+        """
+        inputs = self._df_loader_inputs(df_loader)
+        cached = self._df_loader_cache.get(df_loader)
+        if cached is None or cached[0] != inputs:
+            # Drop DataFrames from loaders that have since been removed from df_loaders.
+            for old_df_loader in list(self._df_loader_cache.keys()):
+                if old_df_loader not in self.df_loaders:
+                    del self._df_loader_cache[old_df_loader]
+            cached = (inputs, df_loader.load_dataframe())
+            self._df_loader_cache[df_loader] = cached
+        return cached[1].copy()
 
     def generate_provenance(self):
-        module_names = ["cohorts", "pyensembl", "varcode", "mhctools", "topiary", "isovar", "scipy", "numpy", "pandas"]
-        module_versions = [__import__(module_name).__version__ for module_name in module_names]
-        return dict(zip(module_names, module_versions))
+        # Module versions can't change within a process, so only look them up once.
+        if self._provenance is None:
+            module_names = ["cohorts", "pyensembl", "varcode", "mhctools", "topiary", "isovar", "scipy", "numpy", "pandas"]
+            module_versions = [__import__(module_name).__version__ for module_name in module_names]
+            self._provenance = dict(zip(module_names, module_versions))
+        return dict(self._provenance)
 
     def load_provenance(self, patient_cache_dir):
         with open(path.join(patient_cache_dir, "PROVENANCE"), "r") as f:
             return json.load(f)
 
     def save_provenance(self, patient_cache_dir, provenance):
-        with open(path.join(patient_cache_dir, "PROVENANCE"), "w") as f:
-            json.dump(provenance, f)
+        provenance_file = path.join(patient_cache_dir, "PROVENANCE")
+        provenance_json = json.dumps(provenance)
+        # Skip rewriting an identical file, as happens on every save to an existing cache dir.
+        if path.exists(provenance_file):
+            with open(provenance_file, "r") as f:
+                if f.read() == provenance_json:
+                    return
+        with open(provenance_file, "w") as f:
+            f.write(provenance_json)
+
+    def _cache_paths(self, cache_name, patient_id, file_name):
+        """ Return the patient's cache directory and the path to `file_name` within it
+        """
+        patient_cache_dir = path.join(self.cache_dir, cache_name, str(patient_id))
+        return patient_cache_dir, path.join(patient_cache_dir, file_name)
 
     def load_from_cache(self, cache_name, patient_id, file_name):
         if not self.cache_results:
             return None
 
-        logger.debug("loading patient {} data from {} cache: {}".format(patient_id, cache_name, file_name))
+        logger.debug("loading patient %s data from %s cache: %s", patient_id, cache_name, file_name)
 
-        cache_dir = path.join(self.cache_dir, cache_name)
-        patient_cache_dir = path.join(cache_dir, str(patient_id))
-        cache_file = path.join(patient_cache_dir, file_name)
+        patient_cache_dir, cache_file = self._cache_paths(cache_name, patient_id, file_name)
+
+        if cache_file in self._memory_cache:
+            logger.debug("... Loading cache from memory")
+            try:
+                self._memory_cache.move_to_end(cache_file)
+                return self._memory_cache[cache_file]
+            except KeyError:
+                # Evicted by another thread in the meantime.
+                pass
 
         if not path.exists(cache_file):
             logger.debug("... cache file does not exist. Checking for older format.")
@@ -461,29 +570,40 @@ class Cohort(Collection):
             else:
                 logger.debug("... Loading cache as pickled file")
                 with open(cache_file, "rb") as f:
-                    return pickle.load(f)
+                    obj = pickle.load(f)
+                self._remember_cached(cache_file, obj)
+                return obj
         except IOError:
             return None
 
+    def _remember_cached(self, cache_file, obj):
+        """ Keep a pickled cache object in memory, evicting the least recently used
+            objects beyond MEMORY_CACHE_SIZE.
+
+            DataFrames (cached as CSV) aren't kept, as callers may modify them.
+        """
+        self._memory_cache[cache_file] = obj
+        while len(self._memory_cache) > MEMORY_CACHE_SIZE:
+            try:
+                self._memory_cache.popitem(last=False)
+            except KeyError:
+                break
+
     def save_to_cache(self, obj, cache_name, patient_id, file_name):
         if not self.cache_results:
             return
 
-        logger.debug("saving patient {} data to {} cache: {}".format(patient_id, cache_name, file_name))
+        logger.debug("saving patient %s data to %s cache: %s", patient_id, cache_name, file_name)
 
-        cache_dir = path.join(self.cache_dir, cache_name)
-        patient_cache_dir = path.join(cache_dir, str(patient_id))
-        cache_file = path.join(patient_cache_dir, file_name)
-
-        if not path.exists(patient_cache_dir):
-            makedirs(patient_cache_dir)
+        patient_cache_dir, cache_file = self._cache_paths(cache_name, patient_id, file_name)
+        makedirs(patient_cache_dir, exist_ok=True)
 
         if type(obj) == pd.DataFrame:
             obj.to_csv(cache_file, index=False)
         else:
             with open(cache_file, "wb") as f:
-                # Protocol=2 for compatability with Py 2 and 3
-                pickle.dump(obj, f)
+                pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+            self._remember_cached(cache_file, obj)
 
         provenance = self.generate_provenance()
         self.save_provenance(patient_cache_dir, provenance)
@@ -494,10 +614,15 @@ class Cohort(Collection):
         return iter(patients)
 
     def patient_from_id(self, id):
-        for patient in self:
-            if patient.id == id:
-                return patient
-        raise ValueError("No patient with ID %s found" % id)
+        try:
+            return self._patients_by_id()[id]
+        except KeyError:
+            pass
+        # A patient may have been swapped into `elements` in place; check again.
+        try:
+            return self._patients_by_id(rebuild=True)[id]
+        except KeyError:
+            raise ValueError("No patient with ID %s found" % id)
 
     def _get_function_name(self, fn, default="None"):
         """ Return name of function, using default value if function not defined
@@ -526,7 +651,7 @@ class Cohort(Collection):
         """
         filter_fn = first_not_none_param([filter_fn, self.filter_fn], no_filter)
         filter_fn_name = self._get_function_name(filter_fn)
-        logger.debug("loading variants with filter_fn: {}".format(filter_fn_name))
+        logger.debug("loading variants with filter_fn: %s", filter_fn_name)
         patient_variants = {}
 
         for patient in self.iter_patients(patients):
@@ -540,7 +665,7 @@ class Cohort(Collection):
             Used to cache filtered variants or effects uniquely depending on filter fn values
         """
         filter_fn_name = self._get_function_name(filter_fn, default="filter-none")
-        logger.debug("Computing hash for filter_fn: {} with kwargs {}".format(filter_fn_name, str(dict(**kwargs))))
+        logger.debug("Computing hash for filter_fn: %s with kwargs %s", filter_fn_name, kwargs)
         # hash function source code
         fn_source = str(dill.source.getsource(filter_fn))
         pickled_fn_source = pickle.dumps(fn_source) ## encode as byte string
@@ -582,7 +707,7 @@ class Cohort(Collection):
             use_filtered_cache = False
         else:
             filter_fn_name = self._get_function_name(filter_fn)
-            logger.debug("loading variants for patient {} with filter_fn {}".format(patient.id, filter_fn_name))
+            logger.debug("loading variants for patient %s with filter_fn %s", patient.id, filter_fn_name)
             use_filtered_cache = use_cache
 
         ## confirm that we can get cache-name (else don't use filtered cache)
@@ -597,7 +722,7 @@ class Cohort(Collection):
                         patient.id, filter_fn_name))
                 use_filtered_cache = False
             else:
-                logger.debug("... trying to load filtered variants from cache: {}".format(filtered_cache_file_name))
+                logger.debug("... trying to load filtered variants from cache: %s", filtered_cache_file_name)
                 try:
                     cached = self.load_from_cache(self.cache_names["variant"], patient.id, filtered_cache_file_name)
                     if cached is not None:
@@ -607,7 +732,7 @@ class Cohort(Collection):
                     pass
 
         ## get merged variants
-        logger.debug("... getting merged variants for: {}".format(patient.id))
+        logger.debug("... getting merged variants for: %s", patient.id)
         merged_variants = self._load_single_patient_merged_variants(patient, use_cache=use_cache)
 
         # Note None here is different from 0. We want to preserve None
@@ -615,13 +740,13 @@ class Cohort(Collection):
             logger.info("Variants did not exist for patient %s" % patient.id)
             return None
 
-        logger.debug("... applying filters to variants for: {}".format(patient.id))
+        logger.debug("... applying filters to variants for: %s", patient.id)
         filtered_variants = filter_variants(variant_collection=merged_variants,
                                             patient=patient,
                                             filter_fn=filter_fn,
                                             **kwargs)
         if use_filtered_cache:
-            logger.debug("... saving filtered variants to cache: {}".format(filtered_cache_file_name))
+            logger.debug("... saving filtered variants to cache: %s", filtered_cache_file_name)
             self.save_to_cache(filtered_variants, self.cache_names["variant"], patient.id, filtered_cache_file_name)
         return filtered_variants
 
@@ -631,7 +756,7 @@ class Cohort(Collection):
             Note that merged variants are not filtered.
             Use `_load_single_patient_variants` to get filtered variants
         """
-        logger.debug("loading merged variants for patient {}".format(patient.id))
+        logger.debug("loading merged variants for patient %s", patient.id)
         no_variants = False
         try:
             # get merged-variants from cache
@@ -695,7 +820,7 @@ class Cohort(Collection):
         return merged_variants
 
     def _merge_variant_collections(self, variant_collections, merge_type):
-        logger.debug("Merging variants using merge type: {}".format(merge_type))
+        logger.debug("Merging variants using merge type: %s", merge_type)
         assert merge_type in ["union", "intersection"], "Unknown merge type: %s" % merge_type
         head = variant_collections[0]
         if merge_type == "union":
@@ -755,13 +880,14 @@ class Cohort(Collection):
                                    patient=patient,
                                    filter_fn=filter_fn)
 
+        # Imported here, as only PolyPhen annotation needs these.
+        import vap  ## vcf-annotate-polyphen
+        from sqlalchemy import create_engine
+
         engine = create_engine("sqlite:///{}".format(self.polyphen_dump_path))
         conn = engine.connect()
 
-        df = pd.DataFrame(columns=["chrom", "pos", "ref", "alt",
-                                   "annotation_found", "gene", "protein",
-                                   "aa_change", "hvar_pred", "hvar_prob",
-                                   "hdiv_pred", "hdiv_prob"])
+        rows = []
         for variant in variants:
             chrom = "chr{}".format(getattr(variant, "contig", None))
             pos = getattr(variant, "start", None)
@@ -778,7 +904,11 @@ class Cohort(Collection):
                           "hdiv_pred", "hdiv_prob"]
             for attr in attributes:
                 datum[attr] = getattr(annotation, attr, None)
-            df = df.append(datum, ignore_index=True)
+            rows.append(datum)
+        df = pd.DataFrame.from_records(rows, columns=["chrom", "pos", "ref", "alt",
+                                                      "annotation_found", "gene", "protein",
+                                                      "aa_change", "hvar_pred", "hvar_prob",
+                                                      "hdiv_pred", "hdiv_prob"])
         df["pos"] = df["pos"].astype("int")
         df["annotation_found"] = df["annotation_found"].astype("bool")
         self.save_to_cache(df, cache_name, patient.id, cached_file_name)
@@ -812,7 +942,7 @@ class Cohort(Collection):
         """
         filter_fn = first_not_none_param([filter_fn, self.filter_fn], no_filter)
         filter_fn_name = self._get_function_name(filter_fn)
-        logger.debug("loading effects with filter_fn {}".format(filter_fn_name))
+        logger.debug("loading effects with filter_fn %s", filter_fn_name)
         patient_effects = {}
         for patient in self.iter_patients(patients):
             effects = self._load_single_patient_effects(
@@ -822,9 +952,8 @@ class Cohort(Collection):
         return patient_effects
 
     def _load_single_patient_effects(self, patient, only_nonsynonymous, all_effects, filter_fn, **kwargs):
-        cached_file_name = "%s-effects.pkl" % self.merge_type
         filter_fn_name = self._get_function_name(filter_fn)
-        logger.debug("loading effects for patient {} with filter_fn {}".format(patient.id, filter_fn_name))
+        logger.debug("loading effects for patient %s with filter_fn %s", patient.id, filter_fn_name)
 
         # Don't filter here, as these variants are used to generate the
         # effects cache; and cached items are never filtered.
@@ -832,35 +961,43 @@ class Cohort(Collection):
         if variants is None:
             return None
 
+        effects = self._load_single_patient_unfiltered_effects(
+            patient, variants, only_nonsynonymous=only_nonsynonymous)
+        return filter_effects(effect_collection=effects,
+                              variant_collection=variants,
+                              patient=patient,
+                              filter_fn=filter_fn,
+                              all_effects=all_effects,
+                              **kwargs)
+
+    def _load_single_patient_unfiltered_effects(self, patient, variants, only_nonsynonymous):
+        """ Load all effects (not just the top priority ones) of a single patient's
+            unfiltered, merged `variants`, computing and caching them if need be.
+        """
+        cached_file_name = "%s-effects.pkl" % self.merge_type
         if only_nonsynonymous:
             cached = self.load_from_cache(self.cache_names["nonsynonymous_effect"], patient.id, cached_file_name)
+            if cached is not None:
+                return cached
+            # Derive nonsynonymous effects from cached effects, if any, rather than
+            # re-annotating the variants.
+            effects = self.load_from_cache(self.cache_names["effect"], patient.id, cached_file_name)
         else:
-            cached = self.load_from_cache(self.cache_names["effect"], patient.id, cached_file_name)
-        if cached is not None:
-            return filter_effects(effect_collection=cached,
-                                  variant_collection=variants,
-                                  patient=patient,
-                                  filter_fn=filter_fn,
-                                  all_effects=all_effects,
-                                  **kwargs)
-
-        effects = variants.effects()
+            effects = self.load_from_cache(self.cache_names["effect"], patient.id, cached_file_name)
+            if effects is not None:
+                return effects
 
-        # Save all effects, rather than top priority only. See https://github.com/hammerlab/cohorts/issues/252.
-        self.save_to_cache(effects, self.cache_names["effect"], patient.id, cached_file_name)
+        if effects is None:
+            effects = variants.effects()
+            # Save all effects, rather than top priority only. See https://github.com/hammerlab/cohorts/issues/252.
+            self.save_to_cache(effects, self.cache_names["effect"], patient.id, cached_file_name)
+        if not only_nonsynonymous:
+            return effects
 
         # Save all nonsynonymous effects, rather than top priority only.
         nonsynonymous_effects = effects.drop_silent_and_noncoding()
         self.save_to_cache(nonsynonymous_effects, self.cache_names["nonsynonymous_effect"], patient.id, cached_file_name)
-
-        return filter_effects(
-            effect_collection=(
-                nonsynonymous_effects if only_nonsynonymous else effects),
-            variant_collection=variants,
-            patient=patient,
-            filter_fn=filter_fn,
-            all_effects=all_effects,
-            **kwargs)
+        return nonsynonymous_effects
 
     def load_kallisto(self):
         """
@@ -927,11 +1064,13 @@ class Cohort(Collection):
             Pandas dataframe with Cufflinks data for all patients
             columns include patient_id, gene_id, gene_short_name, FPKM, FPKM_conf_lo, FPKM_conf_hi
         """
-        return \
-            pd.concat(
-                [self._load_single_patient_cufflinks(patient, filter_ok) for patient in self],
-                copy=False
-        )
+        def load_patient(patient):
+            return self._load_single_patient_cufflinks(patient, filter_ok)
+
+        # Reading each patient's Cufflinks file is I/O-bound, so read them concurrently.
+        with ThreadPoolExecutor(max_workers=max(1, min(MAX_LOAD_WORKERS, len(self)))) as executor:
+            patient_data = list(executor.map(load_patient, self))
+        return pd.concat(patient_data, copy=False)
 
     def _load_single_patient_cufflinks(self, patient, filter_ok):
         """
@@ -1002,17 +1141,11 @@ class Cohort(Collection):
                                       patient=patient,
                                       filter_fn=filter_fn)
 
-        try:
-            mhc_model = self.mhc_class(
-                alleles=patient.hla_alleles,
-                epitope_lengths=epitope_lengths,
-                max_file_records=max_file_records,
-                process_limit=process_limit)
-        except TypeError:
-            # The class may not support max_file_records and process_limit.
-            mhc_model = self.mhc_class(
-                alleles=patient.hla_alleles,
-                epitope_lengths=epitope_lengths)
+        mhc_model = self._get_mhc_model(
+            alleles=patient.hla_alleles,
+            epitope_lengths=epitope_lengths,
+            process_limit=process_limit,
+            max_file_records=max_file_records)
 
         if only_expressed:
             df_isovar = self.load_single_patient_isovar(patient=patient,
@@ -1020,8 +1153,11 @@ class Cohort(Collection):
                                                          epitope_lengths=epitope_lengths)
 
             # Map from isovar rows to protein sequences
+            columns = list(df_isovar.columns)
+            amino_acids_index = columns.index("amino_acids")
             isovar_rows_to_protein_sequences = dict([
-                (frozenset(row.to_dict().items()), row["amino_acids"]) for (i, row) in df_isovar.iterrows()])
+                (frozenset(zip(columns, row)), row[amino_acids_index])
+                for row in df_isovar.itertuples(index=False)])
 
             # MHC binding prediction
             epitopes = mhc_model.predict(isovar_rows_to_protein_sequences)
@@ -1045,6 +1181,9 @@ class Cohort(Collection):
 
             self.save_to_cache(df_epitopes, self.cache_names["expressed_neoantigen"], patient.id, cached_file_name)
         else:
+            # Imported here, as only neoantigen prediction needs topiary.
+            from topiary import predict_epitopes_from_variants, epitopes_to_dataframe
+
             epitopes = predict_epitopes_from_variants(
                 variants=variants,
                 mhc_model=mhc_model,
@@ -1061,6 +1200,32 @@ class Cohort(Collection):
                                   patient=patient,
                                   filter_fn=filter_fn)
 
+    def _get_mhc_model(self, alleles, epitope_lengths, process_limit, max_file_records):
+        """
+        Construct an MHC model, reusing one already built for patients with
+        the same alleles and prediction parameters.
+        """
+        # epitope_lengths may be a single int, as mhctools allows.
+        epitope_lengths_key = (
+            (epitope_lengths,) if isinstance(epitope_lengths, int) else tuple(epitope_lengths))
+        key = (self.mhc_class, tuple(alleles), epitope_lengths_key,
+               process_limit, max_file_records)
+        if key in self._mhc_model_cache:
+            return self._mhc_model_cache[key]
+        try:
+            mhc_model = self.mhc_class(
+                alleles=alleles,
+                epitope_lengths=epitope_lengths,
+                max_file_records=max_file_records,
+                process_limit=process_limit)
+        except TypeError:
+            # The class may not support max_file_records and process_limit.
+            mhc_model = self.mhc_class(
+                alleles=alleles,
+                epitope_lengths=epitope_lengths)
+        self._mhc_model_cache[key] = mhc_model
+        return mhc_model
+
     def get_filtered_isovar_epitopes(self, epitopes, ic50_cutoff):
         """
         Mostly replicates topiary.build_epitope_collection_from_binding_predictions
@@ -1071,18 +1236,45 @@ class Cohort(Collection):
         (dictated by protein_sequence_length); so all we need to do is map that onto the smaller 8-11mer
         peptides generated by mhctools.
         """
-        mutant_binding_predictions = []
-        for binding_prediction in epitopes:
-            peptide = binding_prediction.peptide
-            peptide_offset = binding_prediction.offset
-            isovar_row = dict(binding_prediction.source_sequence_key)
-            is_mutant = contains_mutant_residues(
-                peptide_start_in_protein=peptide_offset,
-                peptide_length=len(peptide),
-                mutation_start_in_protein=isovar_row["variant_aa_interval_start"],
-                mutation_end_in_protein=isovar_row["variant_aa_interval_end"])
-            if is_mutant and binding_prediction.value <= ic50_cutoff:
-                mutant_binding_predictions.append(binding_prediction)
+        epitopes = list(epitopes)
+        if len(epitopes) == 0:
+            return EpitopeCollection([])
+
+        # Many peptides come from the same isovar row, so only parse each row's key once.
+        mutation_intervals = {}
+        def mutation_interval(source_sequence_key):
+            if source_sequence_key not in mutation_intervals:
+                isovar_row = dict(source_sequence_key)
+                mutation_intervals[source_sequence_key] = (
+                    isovar_row["variant_aa_interval_start"],
+                    isovar_row["variant_aa_interval_end"])
+            return mutation_intervals[source_sequence_key]
+        intervals = [mutation_interval(binding_prediction.source_sequence_key)
+                     for binding_prediction in epitopes]
+
+        num_epitopes = len(epitopes)
+        peptide_starts = np.fromiter(
+            (binding_prediction.offset for binding_prediction in epitopes),
+            dtype=int, count=num_epitopes)
+        peptide_lengths = np.fromiter(
+            (len(binding_prediction.peptide) for binding_prediction in epitopes),
+            dtype=int, count=num_epitopes)
+        values = np.fromiter(
+            (binding_prediction.value for binding_prediction in epitopes),
+            dtype=float, count=num_epitopes)
+        mutation_starts = np.fromiter(
+            (start for (start, _) in intervals), dtype=int, count=num_epitopes)
+        mutation_ends = np.fromiter(
+            (end for (_, end) in intervals), dtype=int, count=num_epitopes)
+
+        # Same as topiary.sequence_helpers.contains_mutant_residues, over all peptides at once.
+        is_mutant = ((peptide_starts < mutation_ends) &
+                     (peptide_starts + peptide_lengths > mutation_starts))
+        keep = is_mutant & (values <= ic50_cutoff)
+        mutant_binding_predictions = [
+            binding_prediction
+            for (binding_prediction, is_kept) in zip(epitopes, keep)
+            if is_kept]
         return EpitopeCollection(mutant_binding_predictions)
 
     def load_single_patient_isovar(self, patient, variants, epitope_lengths):
@@ -1093,7 +1285,12 @@ class Cohort(Collection):
         if df_isovar is not None:
             return df_isovar
 
+        # Imported here, as only expressed neoantigen prediction needs these.
         import logging
+        from isovar.allele_reads import reads_overlapping_variants
+        from isovar.protein_sequences import reads_generator_to_protein_sequences_generator, protein_sequences_generator_to_dataframe
+        from pysam import AlignmentFile
+
         logging.disable(logging.INFO)
         if patient.tumor_sample is None:
             raise ValueError("Patient %s has no tumor sample" % patient.id)
@@ -1108,18 +1305,21 @@ class Cohort(Collection):
         #           123456789AB
         # AAAAAAAAAAVAAAAAAAAAA
         protein_sequence_length = (max(epitope_lengths) * 2) - 1
-        allele_reads_generator = reads_overlapping_variants(
-            variants=variants,
-            samfile=rna_bam_file,
-            min_mapping_quality=1)
-        protein_sequences_generator = reads_generator_to_protein_sequences_generator(
-            allele_reads_generator,
-            protein_sequence_length=protein_sequence_length,
-            # Per Alex R.'s suggestion; equivalent to min_reads_supporting_rna_sequence previously
-            min_variant_sequence_coverage=3,
-            max_protein_sequences_per_variant=1, # Otherwise we might have too much neoepitope diversity
-            variant_sequence_assembly=False)
-        df_isovar = protein_sequences_generator_to_dataframe(protein_sequences_generator)
+        try:
+            allele_reads_generator = reads_overlapping_variants(
+                variants=variants,
+                samfile=rna_bam_file,
+                min_mapping_quality=1)
+            protein_sequences_generator = reads_generator_to_protein_sequences_generator(
+                allele_reads_generator,
+                protein_sequence_length=protein_sequence_length,
+                # Per Alex R.'s suggestion; equivalent to min_reads_supporting_rna_sequence previously
+                min_variant_sequence_coverage=3,
+                max_protein_sequences_per_variant=1, # Otherwise we might have too much neoepitope diversity
+                variant_sequence_assembly=False)
+            df_isovar = protein_sequences_generator_to_dataframe(protein_sequences_generator)
+        finally:
+            rna_bam_file.close()
         self.save_to_cache(df_isovar, self.cache_names["isovar"], patient.id, isovar_cached_file_name)
         return df_isovar
 
@@ -1133,19 +1333,27 @@ class Cohort(Collection):
             min_tumor_depth=self.min_coverage_tumor_depth,
             pageant_dir_fn=self.pageant_dir_fn)
 
+    def clear_df_loader_cache(self):
+        """
+        Forget the DataFrames loaded by `df_loaders`, so they are re-loaded on
+        the next call to `as_dataframe` or `load_dataframe`.
+        """
+        self._df_loader_cache = {}
+
     def clear_caches(self):
         for cache in self.cache_names.keys():
             self.clear_cache(cache)
 
     def clear_cache(self, cache):
         cache_path = path.join(self.cache_dir, self.cache_names[cache])
+        for cache_file in list(self._memory_cache.keys()):
+            if cache_file.startswith(path.join(cache_path, "")):
+                self._memory_cache.pop(cache_file, None)
         if path.exists(cache_path):
             rmtree(cache_path)
 
     def cohort_columns(self):
-        cohort_dataframe = self.as_dataframe()
-        column_types = [cohort_dataframe[col].dtype for col in cohort_dataframe.columns]
-        return dict(zip(list(cohort_dataframe.columns), column_types))
+        return dict(self.as_dataframe().dtypes)
 
     def plot_col_from_cols(self, cols, only_allow_one=False, plot_col=None):
         if type(cols) == str:
@@ -1269,7 +1477,7 @@ class Cohort(Collection):
         if boolean_value_map:
             assert set(boolean_value_map.keys()) == set([True, False]), \
                 "Improper mapping of boolean column provided"
-            df[boolean_col] = df[boolean_col].map(lambda v: boolean_value_map[v])
+            df[boolean_col] = df[boolean_col].map(boolean_value_map)
             condition_value = boolean_value_map[True]
 
         if df[plot_col].dtype == "bool":
@@ -13,15 +13,14 @@
 # limitations under the License.
 
 from .variant_filters import no_filter, effect_expressed_filter
-from .varcode_utils import FilterableVariant
-from .utils import first_not_none_param
+from .varcode_utils import FilterableVariant, filter_variants, filter_effects
+from .utils import first_not_none_param, MAX_LOAD_WORKERS
 from .variant_stats import variant_stats_from_variant
 
-from functools import wraps
+from functools import wraps, lru_cache
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-import pandas as pd
 from varcode.effects import Substitution, FrameShift
-from varcode.common import memoize
 from varcode.effects.effect_classes import Exonic
 import inspect
 
@@ -47,10 +46,14 @@ def count_function(func):
     counted up. Also automatically falls back to the Cohort-default filter_fn and normalized_per_mb if
     not specified.
     """
-    # Fall back to Cohort-level defaults.
-    @use_defaults
     @wraps(func)
     def wrapper(row, cohort, filter_fn=None, normalized_per_mb=None, **kwargs):
+        # Fall back to Cohort-level defaults. This is what `use_defaults` does, inlined
+        # to save a layer of function calls on every row.
+        if filter_fn is None:
+            filter_fn = cohort.filter_fn if cohort.filter_fn is not None else no_filter
+        if normalized_per_mb is None:
+            normalized_per_mb = cohort.normalized_per_mb if cohort.normalized_per_mb is not None else False
         per_patient_data = func(row=row,
                                 cohort=cohort,
                                 filter_fn=filter_fn,
@@ -65,11 +68,96 @@ def count_function(func):
         return np.nan
     return wrapper
 
-@memoize
+def _batch_load(cohort, patient_id, key, load_patients):
+    """
+    Load data for the patient with `patient_id` via `load_patients`, a function from a
+    list of `Patient`s to a dict of patient_id to data.
+
+    While `Cohort.as_dataframe` is applying functions, load every patient in the batch
+    with a single call instead, and reuse that result (cached under `key`) for the rest
+    of the rows.
+    """
+    batch_cache = cohort._batch_cache
+    if batch_cache is None:
+        return load_patients([cohort.patient_from_id(patient_id)])
+    if key not in batch_cache:
+        batch_patient_ids = set(cohort._batch_patient_ids)
+        batch_cache[key] = load_patients(
+            [patient for patient in cohort if patient.id in batch_patient_ids])
+    return batch_cache[key]
+
+def _load_all_variants(cohort, patient_id, use_cache=True):
+    """
+    Load a dict of patient_id to unfiltered, merged variants. Within a batch, these are
+    shared by every variant-counting function, each of which applies its own filter_fn.
+
+    This bypasses the per-filter_fn variant cache of `Cohort._load_single_patient_variants`:
+    filtering these variants in memory is cheaper than reading a cached file per function.
+    """
+    def load_patient(patient):
+        return cohort._load_single_patient_variants(
+            patient, filter_fn=None, use_cache=use_cache)
+
+    def load_patients(patients):
+        if len(patients) > 1:
+            # Loading is mostly file I/O and VCF parsing, so load patients concurrently.
+            with ThreadPoolExecutor(max_workers=min(MAX_LOAD_WORKERS, len(patients))) as executor:
+                all_variants = list(executor.map(load_patient, patients))
+        else:
+            all_variants = [load_patient(patient) for patient in patients]
+        patient_variants = {}
+        for patient, variants in zip(patients, all_variants):
+            if variants is not None:
+                patient_variants[patient.id] = variants
+        return patient_variants
+    return _batch_load(cohort, patient_id, key=("variants", use_cache),
+                       load_patients=load_patients)
+
+def _load_all_effects(cohort, patient_id, only_nonsynonymous, use_cache=True):
+    """
+    Load a dict of patient_id to (unfiltered variants, all of their unfiltered effects).
+    Within a batch, these are shared by every effect-counting function.
+
+    All effects are kept, rather than one per variant, because the top priority effect
+    is chosen after filtering. That means holding every batch patient's full effects
+    (once per value of `only_nonsynonymous` in use) until `as_dataframe` returns.
+    """
+    def load_patients(patients):
+        patient_variants = _load_all_variants(cohort, patient_id, use_cache=use_cache)
+        patient_effects = {}
+        for patient in patients:
+            if patient.id in patient_variants:
+                variants = patient_variants[patient.id]
+                effects = cohort._load_single_patient_unfiltered_effects(
+                    patient, variants, only_nonsynonymous=only_nonsynonymous)
+                patient_effects[patient.id] = (variants, effects)
+        return patient_effects
+    return _batch_load(cohort, patient_id, key=("effects", only_nonsynonymous, use_cache),
+                       load_patients=load_patients)
+
 def get_patient_to_mb(cohort):
-    patient_to_mb = dict(cohort.as_dataframe(join_with="ensembl_coverage")[["patient_id", "MB"]].to_dict("split")["data"])
+    # Key on the coverage settings as well, so that changing them isn't masked
+    # by a previously cached result.
+    return _get_patient_to_mb(cohort,
+                              cohort.pageant_coverage_path,
+                              cohort.pageant_dir_fn,
+                              cohort.min_coverage_normal_depth,
+                              cohort.min_coverage_tumor_depth)
+
+@lru_cache(maxsize=32)
+def _get_patient_to_mb(cohort, coverage_path, pageant_dir_fn, min_normal_depth, min_tumor_depth):
+    df = cohort.as_dataframe(join_with="ensembl_coverage")
+    patient_to_mb = dict(zip(df["patient_id"].values, df["MB"].values.astype(float)))
     return patient_to_mb
 
+def _source(func):
+    """
+    The source code of `func`, or "" if there is no function, for use as a docstring.
+    """
+    if func is None:
+        return ""
+    return "".join(inspect.getsourcelines(func)[0])
+
 def count_variants_function_builder(function_name, filterable_variant_function=None):
     """
     Creates a function that counts variants that are filtered by the provided filterable_variant_function.
@@ -79,17 +167,25 @@ def count_variants_function_builder(function_name, filterable_variant_function=N
     """
     @count_function
     def count(row, cohort, filter_fn, normalized_per_mb, **kwargs):
-        def count_filter_fn(filterable_variant, **kwargs):
-            assert filter_fn is not None, "filter_fn should never be None, but it is."
-            return ((filterable_variant_function(filterable_variant) if filterable_variant_function is not None else True) and
-                    filter_fn(filterable_variant, **kwargs))
+        assert filter_fn is not None, "filter_fn should never be None, but it is."
+        if filterable_variant_function is None:
+            count_filter_fn = filter_fn
+        else:
+            def count_filter_fn(filterable_variant, **kwargs):
+                return (filterable_variant_function(filterable_variant) and
+                        filter_fn(filterable_variant, **kwargs))
         patient_id = row["patient_id"]
-        return cohort.load_variants(
-            patients=[cohort.patient_from_id(patient_id)],
+        use_cache = kwargs.pop("use_cache", True)
+        patient_variants = _load_all_variants(cohort, patient_id, use_cache=use_cache)
+        if patient_id not in patient_variants:
+            return {}
+        return {patient_id: filter_variants(
+            variant_collection=patient_variants[patient_id],
+            patient=cohort.patient_from_id(patient_id),
             filter_fn=count_filter_fn,
-            **kwargs)
+            **kwargs)}
     count.__name__ = function_name
-    count.__doc__ = str("".join(inspect.getsourcelines(filterable_variant_function)[0])) if filterable_variant_function is not None else ""
+    count.__doc__ = _source(filterable_variant_function)
     return count
 
 def count_effects_function_builder(function_name, only_nonsynonymous, filterable_effect_function=None):
@@ -101,20 +197,29 @@ def count_effects_function_builder(function_name, only_nonsynonymous, filterable
     """
     @count_function
     def count(row, cohort, filter_fn, normalized_per_mb, **kwargs):
-        def count_filter_fn(filterable_effect, **kwargs):
-            assert filter_fn is not None, "filter_fn should never be None, but it is."
-            return ((filterable_effect_function(filterable_effect) if filterable_effect_function is not None else True) and
-                    filter_fn(filterable_effect, **kwargs))
-        # This only loads one effect per variant.
+        assert filter_fn is not None, "filter_fn should never be None, but it is."
+        if filterable_effect_function is None:
+            count_filter_fn = filter_fn
+        else:
+            def count_filter_fn(filterable_effect, **kwargs):
+                return (filterable_effect_function(filterable_effect) and
+                        filter_fn(filterable_effect, **kwargs))
         patient_id = row["patient_id"]
-        return cohort.load_effects(
-            only_nonsynonymous=only_nonsynonymous,
-            patients=[cohort.patient_from_id(patient_id)],
+        use_cache = kwargs.pop("use_cache", True)
+        patient_effects = _load_all_effects(cohort, patient_id, only_nonsynonymous, use_cache=use_cache)
+        if patient_id not in patient_effects:
+            return {}
+        variant_collection, effect_collection = patient_effects[patient_id]
+        # This only keeps one effect per variant.
+        return {patient_id: filter_effects(
+            effect_collection=effect_collection,
+            variant_collection=variant_collection,
+            patient=cohort.patient_from_id(patient_id),
             filter_fn=count_filter_fn,
-            **kwargs)
+            all_effects=False,
+            **kwargs)}
     count.__name__ = function_name
-    count.__doc__ = (("only_nonsynonymous=%s\n" % only_nonsynonymous) +
-                     str("".join(inspect.getsourcelines(filterable_effect_function)[0])) if filterable_effect_function is not None else "")
+    count.__doc__ = ("only_nonsynonymous=%s\n" % only_nonsynonymous) + _source(filterable_effect_function)
     # Keep track of these to be able to query the returned function for these attributes
     count.only_nonsynonymous = only_nonsynonymous
     count.filterable_effect_function = filterable_effect_function
@@ -156,7 +261,7 @@ missense_snv_count = count_effects_function_builder(
     "missense_snv_count",
     only_nonsynonymous=True,
     filterable_effect_function=lambda filterable_effect: (
-        type(filterable_effect.effect) == Substitution and
+        filterable_effect.effect.__class__ is Substitution and
         filterable_effect.variant.is_snv))
 
 nonsynonymous_indel_count = count_effects_function_builder(
@@ -222,7 +327,7 @@ missense_snv_and_nonsynonymous_indel_count = count_effects_function_builder(
     only_nonsynonymous=True,
     filterable_effect_function=lambda filterable_effect: (
         (filterable_effect.variant.is_indel) or
-         (type(filterable_effect.effect) == Substitution and
+         (filterable_effect.effect.__class__ is Substitution and
           filterable_effect.variant.is_snv)))
 
 @count_function
@@ -275,8 +380,15 @@ def median_vaf_purity(row, cohort, **kwargs):
         variants = variants[patient_id]
     else:
         return np.nan
+    if len(variants) == 0:
+        return np.nan
     def grab_vaf(variant):
         filterable_variant = FilterableVariant(variant, variants, patient)
-        return variant_stats_from_variant(variant, filterable_variant.variant_metadata).tumor_stats.variant_allele_frequency
-    vafs = [grab_vaf(variant) for variant in variants]
-    return 2 * pd.Series(vafs).median()
+        vaf = variant_stats_from_variant(variant, filterable_variant.variant_metadata).tumor_stats.variant_allele_frequency
+        # Some callers (e.g. Strelka) may not report a VAF.
+        return np.nan if vaf is None else vaf
+    vafs = np.fromiter((grab_vaf(variant) for variant in variants), dtype=float, count=len(variants))
+    # np.nanmedian warns on an all-NaN array; Series.median() didn't.
+    if np.isnan(vafs).all():
+        return np.nan
+    return 2 * np.nanmedian(vafs)
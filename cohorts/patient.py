@@ -55,7 +55,7 @@ class Patient(object):
                  progressed=None,
                  progressed_or_deceased=None,
                  benefit=None,
-                 variants=[],
+                 variants=None,
                  normal_sample=None,
                  tumor_sample=None,
                  hla_alleles=None,
@@ -69,7 +69,7 @@ class Patient(object):
         self.progressed = progressed
         self.progressed_or_deceased = progressed_or_deceased
         self.benefit = benefit
-        self.variants = variants
+        self.variants = variants if variants is not None else []
         self.normal_sample = normal_sample
         self.tumor_sample = tumor_sample
         self.hla_alleles = hla_alleles
@@ -93,6 +93,8 @@ class Patient(object):
             "Need at least one of progressed and progressed_or_deceased")
         if self.progressed_or_deceased is None:
             self.progressed_or_deceased = self.progressed or self.deceased
+            # In sync by construction.
+            return
 
         # If we have both of these, ensure that they're in sync
         if self.progressed_or_deceased is not None and self.progressed is not None:
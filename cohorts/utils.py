@@ -21,6 +21,10 @@ from os import path
 
 logger = logging.getLogger(__name__)
 
+# Number of threads used to load per-patient files (e.g. variants) concurrently.
+# Throughput tends to plateau beyond this, as loading becomes disk-bound.
+MAX_LOAD_WORKERS = 6
+
 def get_cache_dir(cache_dir, cache_root_dir=None, *args, **kwargs):
     """
     Return full cache_dir, according to following logic:
@@ -71,7 +75,7 @@ def first_not_none_param(params, default):
 
 def filter_not_null(df, col):
     original_len = len(df)
-    df = df[df[col].notnull()]
+    df = df.dropna(subset=[col])
     updated_len = len(df)
     if updated_len < original_len:
         print("Missing %s for %d patients: from %d to %d" % (col, original_len - updated_len, original_len, updated_len))
@@ -21,7 +21,10 @@ from cohorts import Cohort, Patient
 from cohorts.utils import InvalidDataError
 
 import pandas as pd
+import os
+from os import path
 from nose.tools import raises, eq_, ok_
+from mock import MagicMock
 
 def make_simple_clinical_dataframe(
         os_list=None,
@@ -78,3 +81,68 @@ def test_simple_cohort():
     ok_("age" in columns)
     ok_("pfs" in columns)
     ok_("os" in columns)
+
+def test_memory_cache():
+    cohort = None
+    try:
+        cohort = make_simple_cohort()
+        cache_name = cohort.cache_names["variant"]
+        cohort.save_to_cache({"a": 1}, cache_name, "1", "cached_file.pkl")
+        eq_(cohort.load_from_cache(cache_name, "1", "cached_file.pkl"), {"a": 1})
+
+        # Once cached in memory, loading doesn't need to go back to disk.
+        os.remove(path.join(cohort.cache_dir, cache_name, "1", "cached_file.pkl"))
+        eq_(cohort.load_from_cache(cache_name, "1", "cached_file.pkl"), {"a": 1})
+
+        # Clearing the cache clears it from memory as well.
+        cohort.clear_cache("variant")
+        eq_(cohort.load_from_cache(cache_name, "1", "cached_file.pkl"), None)
+    finally:
+        if cohort is not None:
+            cohort.clear_caches()
+
+def test_mhc_model_reuse():
+    cohort = make_simple_cohort()
+    cohort.mhc_class = MagicMock()
+    model = cohort._get_mhc_model(["HLA-A02:01"], [8, 9], process_limit=10, max_file_records=None)
+    eq_(cohort._get_mhc_model(["HLA-A02:01"], [8, 9], process_limit=10, max_file_records=None), model)
+    eq_(cohort.mhc_class.call_count, 1)
+
+    # Different alleles need their own model.
+    cohort._get_mhc_model(["HLA-B07:02"], [8, 9], process_limit=10, max_file_records=None)
+    eq_(cohort.mhc_class.call_count, 2)
+
+    # A single epitope length is passed through as is.
+    cohort._get_mhc_model(["HLA-A02:01"], 9, process_limit=10, max_file_records=None)
+    eq_(cohort.mhc_class.call_count, 3)
+    eq_(cohort.mhc_class.call_args[1]["epitope_lengths"], 9)
+
+def test_patient_from_id():
+    cohort = make_simple_cohort()
+    eq_(cohort.patient_from_id("4").id, "4")
+
+    filtered_cohort = cohort.filter(lambda patient: patient.id != "4")
+    eq_(filtered_cohort.patient_from_id("5").id, "5")
+
+def test_patient_from_id_after_in_place_changes():
+    cohort = make_simple_cohort()
+    cohort.patient_from_id("4")
+
+    # Appending in place is picked up, and doesn't look like a duplicate ID.
+    new_patient = Patient(id="6", os=100, pfs=50, deceased=False, progressed_or_deceased=True)
+    cohort.elements.append(new_patient)
+    cohort.verify_id_uniqueness()
+    eq_(cohort.patient_from_id("6"), new_patient)
+
+@raises(ValueError)
+def test_patient_from_id_removed_in_place():
+    cohort = make_simple_cohort()
+    patient = cohort.patient_from_id("4")
+    cohort.elements.remove(patient)
+    cohort.patient_from_id("4")
+
+@raises(ValueError)
+def test_patient_from_id_filtered_out():
+    cohort = make_simple_cohort()
+    cohort.patient_from_id("4")
+    cohort.filter(lambda patient: patient.id != "4").patient_from_id("4")
@@ -16,6 +16,7 @@ from __future__ import print_function
 
 from varcode.effects.effect_classes import ExonicSpliceSite, Substitution
 from varcode import Variant, VariantCollection
+from cohorts import Cohort
 from cohorts.variant_filters import no_filter
 from cohorts.functions import *
 
@@ -240,3 +241,122 @@ def test_multiple_variant_forms():
             rmtree(vcf_dir)
         if cohort is not None:
             cohort.clear_caches()
+
+def test_counts_load_patients_in_one_batch():
+    """
+    Counting functions applied via `as_dataframe` should load all patients at once,
+    rather than once per row, and share those variants with each other.
+    """
+    vcf_dir, cohort = None, None
+    try:
+        vcf_dir, cohort = make_cohort([FILE_FORMAT_1])
+        cohort._load_single_patient_variants = MagicMock(
+            wraps=cohort._load_single_patient_variants)
+
+        df = cohort.as_dataframe([snv_count, indel_count])
+        eq_(list(df["snv_count"]), [3, 3, 6])
+        eq_(list(df["indel_count"]), [0, 0, 0])
+        eq_(cohort._load_single_patient_variants.call_count, 3)
+
+        # Outside of `as_dataframe`, a single patient is loaded.
+        row = {"patient_id": "5"}
+        eq_(snv_count(row=row, cohort=cohort), 6)
+        eq_(cohort._load_single_patient_variants.call_count, 4)
+        eq_(cohort._load_single_patient_variants.call_args[0][0].id, "5")
+    finally:
+        if vcf_dir is not None and path.exists(vcf_dir):
+            rmtree(vcf_dir)
+        if cohort is not None:
+            cohort.clear_caches()
+
+def test_effect_counts_load_patients_in_one_batch():
+    """
+    Effect counting functions applied via `as_dataframe` should share a single load of
+    each patient's effects.
+    """
+    vcf_dir, cohort = None, None
+    try:
+        vcf_dir, cohort = make_cohort([FILE_FORMAT_1])
+        cohort._load_single_patient_unfiltered_effects = MagicMock(
+            wraps=cohort._load_single_patient_unfiltered_effects)
+
+        df = cohort.as_dataframe([missense_snv_count, nonsynonymous_snv_count])
+        eq_(list(df["missense_snv_count"]), [3, 3, 6])
+        eq_(list(df["nonsynonymous_snv_count"]), [3, 3, 6])
+        eq_(cohort._load_single_patient_unfiltered_effects.call_count, 3)
+
+        # Same as loading the effects with the count's filter applied.
+        row = {"patient_id": "5"}
+        eq_(missense_snv_count(row=row, cohort=cohort), len(cohort.load_effects(
+            patients=[cohort.patient_from_id("5")], only_nonsynonymous=True)["5"]))
+    finally:
+        if vcf_dir is not None and path.exists(vcf_dir):
+            rmtree(vcf_dir)
+        if cohort is not None:
+            cohort.clear_caches()
+
+def test_batched_counts_with_defaults():
+    """
+    Counts applied together via `as_dataframe` should respect the Cohort's filter_fn
+    and normalized_per_mb.
+    """
+    vcf_dir, cohort = None, None
+    original_load_ensembl_coverage = Cohort.load_ensembl_coverage
+    try:
+        def load_ensembl_coverage(self):
+            return pd.DataFrame({"patient_id": ["1", "4", "5"],
+                                 "Num Loci": [2000000, 5000000, 8000000],
+                                 "MB": [2, 5, 8]})
+        Cohort.load_ensembl_coverage = load_ensembl_coverage
+        vcf_dir, cohort = make_cohort([FILE_FORMAT_1])
+
+        def default_filter_fn(filterable_variant):
+            return filterable_variant.variant.start != 53513530
+        cohort.filter_fn = default_filter_fn
+        df = cohort.as_dataframe([snv_count, missense_snv_count])
+        eq_(list(df["snv_count"]), [2, 2, 5])
+        eq_(list(df["missense_snv_count"]), [2, 2, 5])
+
+        cohort.filter_fn = None
+        df = cohort.as_dataframe([snv_count, missense_snv_count], normalized_per_mb=True)
+        # 3 / 2, 3 / 5, 6 / 8
+        eq_(list(df["snv_count"]), [1.5, 0.6, 0.75])
+        eq_(list(df["missense_snv_count"]), [1.5, 0.6, 0.75])
+    finally:
+        Cohort.load_ensembl_coverage = original_load_ensembl_coverage
+        if vcf_dir is not None and path.exists(vcf_dir):
+            rmtree(vcf_dir)
+        if cohort is not None:
+            cohort.clear_caches()
+
+def test_normalized_counts_follow_coverage_settings():
+    """
+    Changing the coverage depth settings should change per-MB counts, rather than
+    reusing the coverage loaded with the old settings.
+    """
+    vcf_dir, cohort = None, None
+    original_load_ensembl_coverage = Cohort.load_ensembl_coverage
+    try:
+        def load_ensembl_coverage(self):
+            # Fewer MB pass a higher depth cutoff.
+            mb_scale = 30.0 / self.min_coverage_tumor_depth
+            return pd.DataFrame({"patient_id": ["1", "4", "5"],
+                                 "MB": [2 * mb_scale, 5 * mb_scale, 8 * mb_scale]})
+        Cohort.load_ensembl_coverage = load_ensembl_coverage
+        vcf_dir, cohort = make_cohort([FILE_FORMAT_1])
+
+        cohort.min_coverage_tumor_depth = 30
+        df = cohort.as_dataframe(snv_count, normalized_per_mb=True)
+        # 3 / 2, 3 / 5, 6 / 8
+        eq_(list(df["snv_count"]), [1.5, 0.6, 0.75])
+
+        cohort.min_coverage_tumor_depth = 60
+        df = cohort.as_dataframe(snv_count, normalized_per_mb=True)
+        # 3 / 1, 3 / 2.5, 6 / 4
+        eq_(list(df["snv_count"]), [3.0, 1.2, 1.5])
+    finally:
+        Cohort.load_ensembl_coverage = original_load_ensembl_coverage
+        if vcf_dir is not None and path.exists(vcf_dir):
+            rmtree(vcf_dir)
+        if cohort is not None:
+            cohort.clear_caches()
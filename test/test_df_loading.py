@@ -17,7 +17,7 @@ from __future__ import print_function
 from cohorts import Cohort, DataFrameLoader
 
 import pandas as pd
-from nose.tools import eq_
+from nose.tools import eq_, raises
 
 from .test_basic import make_simple_cohort
 
@@ -35,3 +35,54 @@ def test_df_loading():
     # pylint: disable=no-member
     # pylint gets confused by as_dataframe's return type
     eq_(set(df.patient_id), set(["1", "5"]))
+
+def test_df_loading_only_loads_once():
+    cohort = make_simple_cohort()
+    load_calls = []
+    def load_df():
+        load_calls.append(1)
+        return pd.DataFrame({"the_id": ["1", "5", "7"],
+                             "hello_value": ["hello", "goodbye", "hello"]})
+    cohort.df_loaders = [DataFrameLoader("hello", load_df, join_on="the_id")]
+
+    eq_(len(cohort.as_dataframe(join_with="hello")), 2)
+    eq_(len(cohort.as_dataframe(join_with="hello")), 2)
+    eq_(len(load_calls), 1)
+
+    cohort.clear_df_loader_cache()
+    cohort.as_dataframe(join_with="hello")
+    eq_(len(load_calls), 2)
+
+def test_load_dataframe_by_name():
+    cohort = make_simple_cohort()
+    df_hello = pd.DataFrame({"the_id": ["1", "5", "7"],
+                             "hello_value": ["hello", "goodbye", "hello"]})
+    cohort.df_loaders = [DataFrameLoader("hello", lambda: df_hello, join_on="the_id")]
+    eq_(list(cohort.load_dataframe("hello").the_id), ["1", "5", "7"])
+
+    # Replacing df_loaders is picked up by name.
+    df_bye = pd.DataFrame({"the_id": ["4"], "bye_value": ["bye"]})
+    cohort.df_loaders = [DataFrameLoader("bye", lambda: df_bye, join_on="the_id")]
+    eq_(list(cohort.load_dataframe("bye").the_id), ["4"])
+
+    # So is appending to df_loaders in place.
+    cohort.df_loaders.append(DataFrameLoader("hello", lambda: df_hello, join_on="the_id"))
+    eq_(list(cohort.load_dataframe("hello").the_id), ["1", "5", "7"])
+
+@raises(ValueError)
+def test_load_dataframe_missing_name():
+    cohort = make_simple_cohort()
+    cohort.df_loaders = []
+    cohort.load_dataframe("hello")
+
+def test_df_loading_forgets_replaced_loaders():
+    cohort = make_simple_cohort()
+    df_hello = pd.DataFrame({"the_id": ["1", "5", "7"],
+                             "hello_value": ["hello", "goodbye", "hello"]})
+    old_df_loader = DataFrameLoader("hello", lambda: df_hello, join_on="the_id")
+    cohort.df_loaders = [old_df_loader]
+    cohort.as_dataframe(join_with="hello")
+
+    cohort.df_loaders = [DataFrameLoader("hello", lambda: df_hello, join_on="the_id")]
+    cohort.as_dataframe(join_with="hello")
+    eq_(old_df_loader in cohort._df_loader_cache, False)
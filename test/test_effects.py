@@ -17,7 +17,9 @@ from cohorts import Patient, Cohort
 from varcode import Variant, VariantCollection
 from varcode.effects import Substitution, FrameShift, IntronicSpliceSite
 import pandas as pd
+from os import path
 from nose.tools import eq_, ok_
+from mock import patch
 
 def test_splice_filtering_substitution():
     """
@@ -132,3 +134,48 @@ def test_effects_priority_caching():
     finally:
         if cohort is not None:
             cohort.clear_caches()
+
+def test_nonsynonymous_effects_from_effect_cache():
+    """
+    Make sure that loading all effects only caches those, and that nonsynonymous
+    effects are then derived from that cache rather than re-annotated.
+    """
+    cohort = None
+    try:
+        # This variant has 15 effects, 6 of them nonsynonymous.
+        variant = Variant(contig=3, start=20212211, ref="C", alt="T", ensembl=75)
+        patient = Patient(id="patient", os=3, pfs=2, deceased=False, progressed=False, variants=VariantCollection([variant]))
+        cohort_cache_path = generated_data_path("cache")
+        cohort = Cohort(
+            patients=[patient],
+            cache_dir=cohort_cache_path)
+        cached_file_name = "%s-effects.pkl" % cohort.merge_type
+        def cache_file(cache):
+            return path.join(cohort.cache_dir, cohort.cache_names[cache], patient.id, cached_file_name)
+
+        # Nonsynonymous effects computed directly from the variants.
+        cohort.clear_caches()
+        expected_all = cohort.load_effects(all_effects=True, only_nonsynonymous=True)[patient.id]
+        expected_top = cohort.load_effects(only_nonsynonymous=True)[patient.id]
+        eq_(len(expected_all), 6)
+
+        # Loading all effects only writes the effect cache.
+        cohort.clear_caches()
+        effects = cohort.load_effects(all_effects=True)[patient.id]
+        eq_(len(effects), 15)
+        ok_(path.exists(cache_file("effect")))
+        ok_(not path.exists(cache_file("nonsynonymous_effect")))
+
+        # Nonsynonymous effects then come from the effect cache, without re-annotating.
+        with patch.object(VariantCollection, "effects") as mock_effects:
+            nonsynonymous_effects = cohort.load_effects(all_effects=True, only_nonsynonymous=True)[patient.id]
+            top_nonsynonymous_effects = cohort.load_effects(only_nonsynonymous=True)[patient.id]
+            eq_(mock_effects.call_count, 0)
+        ok_(path.exists(cache_file("nonsynonymous_effect")))
+        eq_(sorted(str(effect) for effect in nonsynonymous_effects),
+            sorted(str(effect) for effect in expected_all))
+        eq_([str(effect) for effect in top_nonsynonymous_effects],
+            [str(effect) for effect in expected_top])
+    finally:
+        if cohort is not None:
+            cohort.clear_caches()
@@ -0,0 +1,76 @@
+# Copyright (c) 2017. Mount Sinai School of Medicine
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+
+from collections import namedtuple
+from topiary.sequence_helpers import contains_mutant_residues
+from nose.tools import eq_
+
+from .test_basic import make_simple_cohort
+
+FakeBindingPrediction = namedtuple(
+    "FakeBindingPrediction", ["offset", "peptide", "value", "source_sequence_key"])
+
+def make_source_sequence_key(variant_aa_interval_start, variant_aa_interval_end):
+    return frozenset([("chr", "1"), ("pos", 100), ("ref", "A"), ("alt", "T"),
+                      ("variant_aa_interval_start", variant_aa_interval_start),
+                      ("variant_aa_interval_end", variant_aa_interval_end)])
+
+def expected_isovar_epitopes(epitopes, ic50_cutoff):
+    """
+    The per-prediction check that get_filtered_isovar_epitopes replicates.
+    """
+    expected = []
+    for binding_prediction in epitopes:
+        isovar_row = dict(binding_prediction.source_sequence_key)
+        is_mutant = contains_mutant_residues(
+            peptide_start_in_protein=binding_prediction.offset,
+            peptide_length=len(binding_prediction.peptide),
+            mutation_start_in_protein=isovar_row["variant_aa_interval_start"],
+            mutation_end_in_protein=isovar_row["variant_aa_interval_end"])
+        if is_mutant and binding_prediction.value <= ic50_cutoff:
+            expected.append(binding_prediction)
+    return expected
+
+def test_filtered_isovar_epitopes():
+    cohort = make_simple_cohort()
+    key = make_source_sequence_key(10, 11)
+    other_key = make_source_sequence_key(3, 5)
+    epitopes = [
+        # Ends exactly at variant_aa_interval_start: doesn't overlap.
+        FakeBindingPrediction(2, "SIINFEKL", 100.0, key),
+        # Last residue is the mutated one.
+        FakeBindingPrediction(3, "SIINFEKL", 100.0, key),
+        # Starts at variant_aa_interval_end: doesn't overlap.
+        FakeBindingPrediction(11, "SIINFEKL", 100.0, key),
+        # First residue is the mutated one.
+        FakeBindingPrediction(10, "SIINFEKL", 100.0, key),
+        # Binds exactly at the cutoff: kept.
+        FakeBindingPrediction(6, "SIINFEKLV", 500.0, key),
+        # Binds just above the cutoff: dropped.
+        FakeBindingPrediction(6, "SIINFEKLV", 500.1, key),
+        # A different isovar row, with its own interval.
+        FakeBindingPrediction(0, "SIINFEKL", 50.0, other_key),
+        FakeBindingPrediction(5, "SIINFEKL", 50.0, other_key),
+    ]
+    # EpitopeCollection sorts by value, so compare without order.
+    filtered = list(cohort.get_filtered_isovar_epitopes(epitopes, ic50_cutoff=500))
+    eq_(len(filtered), 4)
+    eq_(set(filtered), set(expected_isovar_epitopes(epitopes, ic50_cutoff=500)))
+    eq_(set(filtered), set([epitopes[1], epitopes[3], epitopes[4], epitopes[6]]))
+
+def test_filtered_isovar_epitopes_empty():
+    cohort = make_simple_cohort()
+    eq_(list(cohort.get_filtered_isovar_epitopes([], ic50_cutoff=500)), [])